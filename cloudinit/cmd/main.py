@@ -19,8 +19,9 @@ import sys
 import time
 import traceback
 import logging
-from typing import Tuple
+from typing import NamedTuple, Optional, Tuple
 
+from cloudinit import importer
 from cloudinit import netinfo
 from cloudinit import signal_handler
 from cloudinit import sources
@@ -64,6 +65,74 @@ FREQ_SHORT_NAMES = {
     "once": PER_ONCE,
 }
 
+# All subcommands, in the order cloud-init --help lists them
+SUBCOMMANDS = (
+    "init",
+    "modules",
+    "single",
+    "query",
+    "features",
+    "analyze",
+    "devel",
+    "collect-logs",
+    "clean",
+    "status",
+    "schema",
+)
+
+
+class LazySubcommand(NamedTuple):
+    """A subcommand implemented outside of this module.
+
+    parser is the "module:function" populating its subparser. action is the
+    action name and "module:function" handler main dispatches to, if any.
+    """
+
+    help: str
+    parser: str
+    action: Optional[Tuple[str, str]] = None
+
+
+# Subcommands whose module is only imported when that subcommand is run
+LAZY_SUBCOMMANDS = {
+    "query": LazySubcommand(
+        help="Query standardized instance metadata from the command line.",
+        parser="cloudinit.cmd.query:get_parser",
+        action=("render", "cloudinit.cmd.query:handle_args"),
+    ),
+    "analyze": LazySubcommand(
+        help="Devel tool: Analyze cloud-init logs and data.",
+        parser="cloudinit.analyze:get_parser",
+    ),
+    "devel": LazySubcommand(
+        help="Run development tools.",
+        parser="cloudinit.cmd.devel.parser:get_parser",
+    ),
+    "collect-logs": LazySubcommand(
+        help="Collect and tar all cloud-init debug info.",
+        parser="cloudinit.cmd.devel.logs:get_parser",
+        action=(
+            "collect-logs",
+            "cloudinit.cmd.devel.logs:handle_collect_logs_args",
+        ),
+    ),
+    "clean": LazySubcommand(
+        help="Remove logs and artifacts so cloud-init can re-run.",
+        parser="cloudinit.cmd.clean:get_parser",
+        action=("clean", "cloudinit.cmd.clean:handle_clean_args"),
+    ),
+    "status": LazySubcommand(
+        help="Report cloud-init status or wait on completion.",
+        parser="cloudinit.cmd.status:get_parser",
+        action=("status", "cloudinit.cmd.status:handle_status_args"),
+    ),
+    "schema": LazySubcommand(
+        help="Validate cloud-config files using jsonschema.",
+        parser="cloudinit.config.schema:get_parser",
+        action=("schema", "cloudinit.config.schema:handle_schema_args"),
+    ),
+}
+
 LOG = logging.getLogger(__name__)
 
 
@@ -855,43 +924,35 @@ def main_features(name, args):
     sys.stdout.write("\n".join(sorted(version.FEATURES)) + "\n")
 
 
-def main(sysv_args=None):
-    configure_root_logger()
-    if not sysv_args:
-        sysv_args = sys.argv
-    parser = argparse.ArgumentParser(prog=sysv_args.pop(0))
+def _load_entry_point(path):
+    """Import and return the "module:attribute" entry point at path."""
+    module_name, attr = path.split(":")
+    return getattr(importer.import_module(module_name), attr)
 
-    # Top level args
-    parser.add_argument(
-        "--version",
-        "-v",
-        action="version",
-        version="%(prog)s " + (version.version_string()),
-        help="Show program's version number and exit.",
-    )
-    parser.add_argument(
-        "--debug",
-        "-d",
-        action="store_true",
-        help="Show additional pre-action logging (default: %(default)s).",
-        default=False,
-    )
-    parser.add_argument(
-        "--force",
-        action="store_true",
-        help=(
-            "Force running even if no datasource is"
-            " found (use at your own risk)."
-        ),
-        dest="force",
-        default=False,
+
+def _add_lazy_subparser(subparsers, name, subcommand):
+    """Add the LAZY_SUBCOMMANDS subparser name, loading it if requested."""
+    lazy = LAZY_SUBCOMMANDS[name]
+    subparser = subparsers.add_parser(name, help=lazy.help)
+    if name != subcommand:
+        return
+    _load_entry_point(lazy.parser)(subparser)
+    if lazy.action:
+        action_name, handler = lazy.action
+        subparser.set_defaults(
+            action=(action_name, _load_entry_point(handler))
+        )
+
+
+def get_subcommand(args) -> Optional[str]:
+    """Return the subcommand named in args, or None if there is none."""
+    return next(
+        (posarg for posarg in args if not posarg.startswith("-")), None
     )
 
-    parser.set_defaults(reporter=None)
-    subparsers = parser.add_subparsers(title="Subcommands", dest="subcommand")
-    subparsers.required = True
 
-    # Each action and its sub-options (if any)
+def _add_init_subparser(subparsers):
+    """Add the subparser of the init subcommand."""
     parser_init = subparsers.add_parser(
         "init", help="Initialize cloud-init and perform initial modules."
     )
@@ -914,6 +975,9 @@ def main(sysv_args=None):
     # the functor to use to run this subcommand
     parser_init.set_defaults(action=("init", main_init))
 
+
+def _add_modules_subparser(subparsers):
+    """Add the subparser of the modules subcommand."""
     # These settings are used for the 'config' and 'final' stages
     parser_mod = subparsers.add_parser(
         "modules", help="Activate modules using a given configuration key."
@@ -936,6 +1000,9 @@ def main(sysv_args=None):
     )
     parser_mod.set_defaults(action=("modules", main_modules))
 
+
+def _add_single_subparser(subparsers):
+    """Add the subparser of the single subcommand."""
     # This subcommand allows you to run a single module
     parser_single = subparsers.add_parser(
         "single", help="Run a single module."
@@ -976,101 +1043,74 @@ def main(sysv_args=None):
     )
     parser_single.set_defaults(action=("single", main_single))
 
-    parser_query = subparsers.add_parser(
-        "query",
-        help="Query standardized instance metadata from the command line.",
-    )
 
+def _add_features_subparser(subparsers):
+    """Add the subparser of the features subcommand."""
     parser_features = subparsers.add_parser(
         "features", help="List defined features."
     )
     parser_features.set_defaults(action=("features", main_features))
 
-    parser_analyze = subparsers.add_parser(
-        "analyze", help="Devel tool: Analyze cloud-init logs and data."
-    )
 
-    parser_devel = subparsers.add_parser(
-        "devel", help="Run development tools."
-    )
+def _build_parser(prog="cloud-init", subcommand=None):
+    """Build the cloud-init argument parser.
 
-    parser_collect_logs = subparsers.add_parser(
-        "collect-logs", help="Collect and tar all cloud-init debug info."
-    )
+    Subparsers of subcommands implemented outside of this module are only
+    populated when that subcommand is passed, to avoid their load cost.
+    """
+    parser = argparse.ArgumentParser(prog=prog)
 
-    parser_clean = subparsers.add_parser(
-        "clean", help="Remove logs and artifacts so cloud-init can re-run."
+    # Top level args
+    parser.add_argument(
+        "--version",
+        "-v",
+        action="version",
+        version="%(prog)s " + (version.version_string()),
+        help="Show program's version number and exit.",
     )
-
-    parser_status = subparsers.add_parser(
-        "status", help="Report cloud-init status or wait on completion."
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Show additional pre-action logging (default: %(default)s).",
+        default=False,
     )
-
-    parser_schema = subparsers.add_parser(
-        "schema", help="Validate cloud-config files using jsonschema."
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=(
+            "Force running even if no datasource is"
+            " found (use at your own risk)."
+        ),
+        dest="force",
+        default=False,
     )
 
-    if sysv_args:
-        # Only load subparsers if subcommand is specified to avoid load cost
-        subcommand = next(
-            (posarg for posarg in sysv_args if not posarg.startswith("-")),
-            None,
-        )
-        if subcommand == "analyze":
-            from cloudinit.analyze import get_parser as analyze_parser
-
-            # Construct analyze subcommand parser
-            analyze_parser(parser_analyze)
-        elif subcommand == "devel":
-            from cloudinit.cmd.devel.parser import get_parser as devel_parser
-
-            # Construct devel subcommand parser
-            devel_parser(parser_devel)
-        elif subcommand == "collect-logs":
-            from cloudinit.cmd.devel.logs import (
-                get_parser as logs_parser,
-                handle_collect_logs_args,
-            )
-
-            logs_parser(parser_collect_logs)
-            parser_collect_logs.set_defaults(
-                action=("collect-logs", handle_collect_logs_args)
-            )
-        elif subcommand == "clean":
-            from cloudinit.cmd.clean import (
-                get_parser as clean_parser,
-                handle_clean_args,
-            )
-
-            clean_parser(parser_clean)
-            parser_clean.set_defaults(action=("clean", handle_clean_args))
-        elif subcommand == "query":
-            from cloudinit.cmd.query import (
-                get_parser as query_parser,
-                handle_args as handle_query_args,
-            )
-
-            query_parser(parser_query)
-            parser_query.set_defaults(action=("render", handle_query_args))
-        elif subcommand == "schema":
-            from cloudinit.config.schema import (
-                get_parser as schema_parser,
-                handle_schema_args,
-            )
+    parser.set_defaults(reporter=None)
+    subparsers = parser.add_subparsers(title="Subcommands", dest="subcommand")
+    subparsers.required = True
 
-            schema_parser(parser_schema)
-            parser_schema.set_defaults(action=("schema", handle_schema_args))
-        elif subcommand == "status":
-            from cloudinit.cmd.status import (
-                get_parser as status_parser,
-                handle_status_args,
-            )
+    # Each action and its sub-options (if any), in the order listed in help
+    in_module_subparsers = {
+        "init": _add_init_subparser,
+        "modules": _add_modules_subparser,
+        "single": _add_single_subparser,
+        "features": _add_features_subparser,
+    }
+    for name in SUBCOMMANDS:
+        if name in LAZY_SUBCOMMANDS:
+            # Subcommands implemented outside of this module are always
+            # listed, but only load subparsers if subcommand is specified to
+            # avoid load cost
+            _add_lazy_subparser(subparsers, name, subcommand)
+        else:
+            in_module_subparsers[name](subparsers)
 
-            status_parser(parser_status)
-            parser_status.set_defaults(action=("status", handle_status_args))
+    return parser
 
-    args = parser.parse_args(args=sysv_args)
 
+def run_subcommand(args):
+    """Run the subcommand selected by the parsed args."""
     # Subparsers.required = True and each subparser sets action=(name, functor)
     (name, functor) = args.action
 
@@ -1135,6 +1175,16 @@ def main(sysv_args=None):
     return retval
 
 
+def main(sysv_args=None):
+    configure_root_logger()
+    if not sysv_args:
+        sysv_args = sys.argv
+    prog = sysv_args.pop(0)
+    parser = _build_parser(prog=prog, subcommand=get_subcommand(sysv_args))
+    args = parser.parse_args(args=sysv_args)
+    return run_subcommand(args)
+
+
 if __name__ == "__main__":
     if "TZ" not in os.environ:
         os.environ["TZ"] = ":/etc/localtime"
@@ -1,9 +1,11 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import argparse
 import contextlib
 import io
 import logging
 import os
+import re
 from collections import namedtuple
 
 import pytest
@@ -16,23 +18,72 @@ mock = test_helpers.mock
 
 M_PATH = "cloudinit.cmd.main."
 
+FakeArgs = namedtuple("FakeArgs", ["action", "local", "mode"])
 
-@pytest.fixture(autouse=False)
-def mock_get_user_data_file(mocker, tmpdir):
-    yield mocker.patch(
+# Stale status artifacts left behind by a previous boot
+OLD_STATUS_FILES = {"status.json": "old", "result.json": "old"}
+
+
+@pytest.fixture(scope="module")
+def mock_get_user_data_file(module_mocker, tmp_path_factory):
+    yield module_mocker.patch(
         "cloudinit.cmd.devel.logs._get_user_data_file",
-        return_value=tmpdir.join("cloud"),
+        return_value=str(tmp_path_factory.mktemp("user_data") / "cloud"),
     )
 
 
+def assert_namespace(namespace, **expected):
+    """Assert that namespace has the expected attribute values."""
+    assert expected == {attr: getattr(namespace, attr) for attr in expected}
+
+
+def get_subparser(parser, subcommand):
+    """Return the subparser of parser handling subcommand."""
+    subparsers = next(
+        action
+        for action in parser._actions
+        if isinstance(action, argparse._SubParsersAction)
+    )
+    return subparsers.choices[subcommand]
+
+
+@pytest.fixture(scope="session")
+def cli_parser():
+    """Build the cloud-init parser once for the whole session.
+
+    Only use it to inspect help output. Tests which dispatch a subcommand
+    go through _call_main, which builds a parser under the test's patches.
+    """
+    return cli._build_parser()
+
+
+@pytest.fixture(scope="module")
+def all_docs():
+    """Render the schema docs of all modules once for the test module."""
+    out = io.StringIO()
+    # Building the schema subparser reads the cloud config too
+    with mock.patch("cloudinit.stages.Init._read_cfg", return_value={}):
+        parser = cli._build_parser(subcommand="schema")
+        args = parser.parse_args(["schema", "--docs", "all"])
+        with contextlib.redirect_stdout(out):
+            cli.run_subcommand(args)
+    return out.getvalue()
+
+
 class TestCLI:
     def _call_main(self, sysv_args=None):
         if not sysv_args:
             sysv_args = ["cloud-init"]
-        try:
-            return cli.main(sysv_args=sysv_args)
-        except SystemExit as e:
-            return e.code
+        args = sysv_args[1:]
+        # Build the parser after any patching, since it binds the handlers
+        parser = cli._build_parser(subcommand=cli.get_subcommand(args))
+        return cli.run_subcommand(parser.parse_args(args))
+
+    def _call_main_exit_code(self, sysv_args=None):
+        """Call main expecting it to exit and return the exit code."""
+        with pytest.raises(SystemExit) as exc_info:
+            self._call_main(sysv_args)
+        return exc_info.value.code
 
     @pytest.mark.parametrize(
         "action,name,match",
@@ -51,10 +102,11 @@ class TestCLI:
             ),
         ],
     )
-    def test_status_wrapper_errors(self, action, name, match, caplog, tmpdir):
-        data_d = tmpdir.join("data")
-        link_d = tmpdir.join("link")
-        FakeArgs = namedtuple("FakeArgs", ["action", "local", "mode"])
+    def test_status_wrapper_errors(
+        self, action, name, match, caplog, tmp_path
+    ):
+        data_d = tmp_path / "data"
+        link_d = tmp_path / "link"
         my_action = mock.Mock()
 
         myargs = FakeArgs((action, my_action), False, "bogusmode")
@@ -66,21 +118,17 @@ class TestCLI:
     def test_status_wrapper_init_local_writes_fresh_status_info(
         self,
         m_json,
-        tmpdir,
+        tmp_path,
     ):
         """When running in init-local mode, status_wrapper writes status.json.
 
         Old status and results artifacts are also removed.
         """
-        data_d = tmpdir.join("data")
-        link_d = tmpdir.join("link")
+        data_d = tmp_path / "data"
+        link_d = tmp_path / "link"
         # Write old artifacts which will be removed or updated.
         for _dir in data_d, link_d:
-            test_helpers.populate_dir(
-                str(_dir), {"status.json": "old", "result.json": "old"}
-            )
-
-        FakeArgs = namedtuple("FakeArgs", ["action", "local", "mode"])
+            test_helpers.populate_dir(str(_dir), OLD_STATUS_FILES)
 
         def myaction(name, args):
             # Return an error to watch status capture them
@@ -101,24 +149,22 @@ class TestCLI:
         assert ["an error"] == status_v1["init-local"]["errors"]
         assert "SomeDatasource" == status_v1["datasource"]
         assert False is os.path.exists(
-            data_d.join("result.json")
+            data_d / "result.json"
         ), "unexpected result.json found"
         assert False is os.path.exists(
-            link_d.join("result.json")
+            link_d / "result.json"
         ), "unexpected result.json link found"
 
     @mock.patch("cloudinit.cmd.main.atomic_helper.write_json")
     def test_status_wrapper_init_local_honor_cloud_dir(
-        self, m_json, mocker, tmpdir
+        self, m_json, mocker, tmp_path
     ):
         """When running in init-local mode, status_wrapper honors cloud_dir."""
-        cloud_dir = tmpdir.join("cloud")
+        cloud_dir = tmp_path / "cloud"
         paths = helpers.Paths({"cloud_dir": str(cloud_dir)})
         mocker.patch(M_PATH + "read_cfg_paths", return_value=paths)
-        data_d = cloud_dir.join("data")
-        link_d = tmpdir.join("link")
-
-        FakeArgs = namedtuple("FakeArgs", ["action", "local", "mode"])
+        data_d = cloud_dir / "data"
+        link_d = tmp_path / "link"
 
         def myaction(name, args):
             # Return an error to watch status capture them
@@ -132,45 +178,63 @@ class TestCLI:
         assert ["an_error"] == status_v1["init-local"]["errors"]
         assert "SomeDatasource" == status_v1["datasource"]
         assert False is os.path.exists(
-            data_d.join("result.json")
+            data_d / "result.json"
         ), "unexpected result.json found"
         assert False is os.path.exists(
-            link_d.join("result.json")
+            link_d / "result.json"
         ), "unexpected result.json link found"
 
     def test_no_arguments_shows_usage(self, capsys):
-        exit_code = self._call_main()
-        _out, err = capsys.readouterr()
-        assert "usage: cloud-init" in err
-        assert 2 == exit_code
-
-    def test_no_arguments_shows_error_message(self, capsys):
-        exit_code = self._call_main()
+        exit_code = self._call_main_exit_code()
         missing_subcommand_message = (
             "the following arguments are required: subcommand"
         )
         _out, err = capsys.readouterr()
+        assert "usage: cloud-init" in err
         assert (
             missing_subcommand_message in err
         ), "Did not find error message for missing subcommand"
         assert 2 == exit_code
 
-    def test_all_subcommands_represented_in_help(self, capsys):
+    def test_all_subcommands_represented_in_help(self, cli_parser):
         """All known subparsers are represented in the cloud-int help doc."""
-        self._call_main()
-        _out, err = capsys.readouterr()
-        expected_subcommands = [
-            "analyze",
-            "clean",
-            "devel",
-            "features",
-            "init",
-            "modules",
-            "single",
-            "schema",
-        ]
-        for subcommand in expected_subcommands:
-            assert subcommand in err
+        err = cli_parser.format_help()
+        expected_subcommands = frozenset(
+            [
+                "analyze",
+                "clean",
+                "devel",
+                "features",
+                "init",
+                "modules",
+                "single",
+                "schema",
+            ]
+        )
+        pattern = re.compile("|".join(map(re.escape, expected_subcommands)))
+        assert expected_subcommands == set(pattern.findall(err))
+
+    def test_subcommands_listed_in_documented_order(self, cli_parser):
+        """Subcommands are listed in help in the order doc/rtd documents."""
+        assert (
+            "{init,modules,single,query,features,analyze,devel,collect-logs,"
+            "clean,status,schema}" in cli_parser.format_help()
+        )
+
+    def test_lazy_subcommands_are_listed(self):
+        """Every LAZY_SUBCOMMANDS entry has a place in SUBCOMMANDS."""
+        assert set(cli.LAZY_SUBCOMMANDS) <= set(cli.SUBCOMMANDS)
+
+    def test_build_parser_imports_only_requested_subcommand(self, mocker):
+        """Subcommand modules are only imported when that subcommand runs."""
+        m_import = mocker.patch(M_PATH + "importer.import_module")
+        cli._build_parser()
+        assert [] == m_import.call_args_list
+        cli._build_parser(subcommand="clean")
+        # Once for its subparser and once for its handler
+        assert [mock.call("cloudinit.cmd.clean")] * 2 == (
+            m_import.call_args_list
+        )
 
     @pytest.mark.parametrize(
         "subcommand,log_to_stderr,mocks",
@@ -205,22 +269,46 @@ class TestCLI:
         with contextlib.ExitStack() as mockstack:
             for mymock in mocks:
                 mockstack.enter_context(mymock)
-            self._call_main(["cloud-init", subcommand])
+            # Use a fresh parser so lazily loaded handlers pick up the mocks
+            cli.main(["cloud-init", subcommand])
         if log_to_stderr:
             setup_basic_logging.assert_called_once_with(logging.WARNING)
         else:
             setup_basic_logging.assert_not_called()
 
-    @pytest.mark.parametrize("subcommand", ["init", "modules"])
-    @mock.patch("cloudinit.cmd.main.status_wrapper")
-    def test_modules_subcommand_parser(self, m_status_wrapper, subcommand):
-        """The subcommand 'subcommand' calls status_wrapper passing modules."""
-        self._call_main(["cloud-init", subcommand])
-        (name, parseargs) = m_status_wrapper.call_args_list[0][0]
+    @pytest.mark.parametrize(
+        "subcommand,extra_args,target,expected",
+        [
+            ("init", [], "status_wrapper", {"local": False}),
+            ("modules", [], "status_wrapper", {"mode": "config"}),
+            (
+                "single",
+                ["--name", "cc_ntp"],
+                "main_single",
+                {"frequency": None, "name": "cc_ntp", "report": False},
+            ),
+            ("features", [], "main_features", {}),
+        ],
+    )
+    def test_subcommand_dispatch(
+        self, subcommand, extra_args, target, expected, mocker
+    ):
+        """Each subcommand calls its handler passing the parsed args.
+
+        The init and modules stages are run through status_wrapper.
+        """
+        m_target = mocker.patch(M_PATH + target)
+        self._call_main(["cloud-init", subcommand] + extra_args)
+        (name, parseargs) = m_target.call_args_list[0][0]
         assert subcommand == name
-        assert subcommand == parseargs.subcommand
-        assert subcommand == parseargs.action[0]
-        assert f"main_{subcommand}" == parseargs.action[1].__name__
+        assert_namespace(
+            parseargs,
+            subcommand=subcommand,
+            action=(subcommand, getattr(cli, f"main_{subcommand}")),
+            debug=False,
+            force=False,
+            **expected,
+        )
 
     @pytest.mark.parametrize(
         "subcommand",
@@ -234,56 +322,37 @@ class TestCLI:
         ],
     )
     @mock.patch("cloudinit.stages.Init._read_cfg", return_value={})
-    def test_conditional_subcommands_from_entry_point_sys_argv(
-        self, m_read_cfg, subcommand, capsys, mock_get_user_data_file, tmpdir
+    def test_subcommand_parser(
+        self, m_read_cfg, subcommand, mock_get_user_data_file
     ):
-        """Subcommands from entry-point are properly parsed from sys.argv."""
-        expected_error = f"usage: cloud-init {subcommand}"
-        # The cloud-init entrypoint calls main without passing sys_argv
-        with mock.patch("sys.argv", ["cloud-init", subcommand, "-h"]):
-            try:
-                cli.main()
-            except SystemExit as e:
-                assert 0 == e.code  # exit 2 on proper -h usage
-        out, _err = capsys.readouterr()
-        assert expected_error in out
-
-    @pytest.mark.parametrize(
-        "subcommand",
-        [
-            "clean",
-            "collect-logs",
-            "status",
-        ],
-    )
-    def test_subcommand_parser(self, subcommand, mock_get_user_data_file):
         """cloud-init `subcommand` calls its subparser."""
-        # Provide -h param to `subcommand` to avoid having to mock behavior.
-        out = io.StringIO()
-        with contextlib.redirect_stdout(out):
-            self._call_main(["cloud-init", subcommand, "-h"])
-        assert f"usage: cloud-init {subcommand}" in out.getvalue()
+        out = get_subparser(
+            cli._build_parser(subcommand=subcommand), subcommand
+        ).format_help()
+        assert f"usage: cloud-init {subcommand}" in out
 
     @pytest.mark.parametrize(
-        "args,expected_subcommands",
+        "subcommand,expected_subcommands",
         [
-            ([], ["schema"]),
-            (["analyze"], ["blame", "show", "dump"]),
+            (None, ["schema"]),
+            ("analyze", ["blame", "show", "dump"]),
         ],
     )
     def test_subcommand_parser_multi_arg(
-        self, args, expected_subcommands, capsys
+        self, subcommand, expected_subcommands
     ):
         """The subcommand cloud-init schema calls the correct subparser."""
-        self._call_main(["cloud-init"] + args)
-        _out, err = capsys.readouterr()
-        for subcommand in expected_subcommands:
-            assert subcommand in err
+        parser = cli._build_parser(subcommand=subcommand)
+        if subcommand:
+            parser = get_subparser(parser, subcommand)
+        err = parser.format_help()
+        for expected in expected_subcommands:
+            assert expected in err
 
     @mock.patch("cloudinit.stages.Init._read_cfg", return_value={})
     def test_wb_schema_subcommand_parser(self, m_read_cfg, capsys):
         """The subcommand cloud-init schema calls the correct subparser."""
-        exit_code = self._call_main(["cloud-init", "schema"])
+        exit_code = self._call_main_exit_code(["cloud-init", "schema"])
         _out, err = capsys.readouterr()
         assert 1 == exit_code
         # Known whitebox output from schema subcommand
@@ -294,10 +363,9 @@ class TestCLI:
         )
 
     @pytest.mark.parametrize(
-        "args,expected_doc_sections,is_error",
+        "expected_doc_sections",
         [
             pytest.param(
-                ["all"],
                 [
                     "**Supported distros:** all",
                     "**Supported distros:** almalinux, alpine, centos, "
@@ -311,27 +379,33 @@ class TestCLI:
                     "(``true``/``false``/``noblock``)",
                     "runcmd:\n             - [ ls, -l, / ]\n",
                 ],
-                False,
                 id="all_spot_check",
             ),
-            pytest.param(
-                ["cc_runcmd"],
-                ["\nRuncmd\n------\n\nRun arbitrary commands\n"],
-                False,
-                id="single_spot_check",
-            ),
             pytest.param(
-                [
-                    "cc_runcmd",
-                    "cc_resizefs",
-                ],
                 [
                     "\nRuncmd\n------\n\nRun arbitrary commands",
                     "\nResizefs\n--------\n\nResize filesystem",
                 ],
-                False,
                 id="multiple_spot_check",
             ),
+        ],
+    )
+    def test_wb_schema_subcommand_all_docs(
+        self, expected_doc_sections, all_docs
+    ):
+        """Validate that doc content of all modules has correct values."""
+        for expected in expected_doc_sections:
+            assert expected in all_docs
+
+    @pytest.mark.parametrize(
+        "args,expected_doc_sections,is_error",
+        [
+            pytest.param(
+                ["cc_runcmd"],
+                ["\nRuncmd\n------\n\nRun arbitrary commands\n"],
+                False,
+                id="single_spot_check",
+            ),
             pytest.param(
                 ["garbage_value"],
                 ["Invalid --docs value"],
@@ -342,47 +416,20 @@ class TestCLI:
     )
     @mock.patch("cloudinit.stages.Init._read_cfg", return_value={})
     def test_wb_schema_subcommand(
-        self, m_read_cfg, args, expected_doc_sections, is_error
+        self,
+        m_read_cfg,
+        args,
+        expected_doc_sections,
+        is_error,
+        capsys,
     ):
         """Validate that doc content has correct values."""
-
-        # Note: patchStdoutAndStderr() is convenient for reducing boilerplate,
-        # but inspecting the code for debugging is not ideal
-        # contextlib.redirect_stdout() provides similar behavior as a context
-        # manager
-        out_or_err = io.StringIO()
-        redirecter = (
-            contextlib.redirect_stderr
-            if is_error
-            else contextlib.redirect_stdout
-        )
-        with redirecter(out_or_err):
-            self._call_main(["cloud-init", "schema", "--docs"] + args)
-        out_or_err = out_or_err.getvalue()
+        sysv_args = ["cloud-init", "schema", "--docs"] + args
+        if is_error:
+            assert 1 == self._call_main_exit_code(sysv_args)
+        else:
+            self._call_main(sysv_args)
+        out, err = capsys.readouterr()
+        out_or_err = err if is_error else out
         for expected in expected_doc_sections:
             assert expected in out_or_err
-
-    @mock.patch("cloudinit.cmd.main.main_single")
-    def test_single_subcommand(self, m_main_single):
-        """The subcommand 'single' calls main_single with valid args."""
-        self._call_main(["cloud-init", "single", "--name", "cc_ntp"])
-        (name, parseargs) = m_main_single.call_args_list[0][0]
-        assert "single" == name
-        assert "single" == parseargs.subcommand
-        assert "single" == parseargs.action[0]
-        assert False is parseargs.debug
-        assert False is parseargs.force
-        assert None is parseargs.frequency
-        assert "cc_ntp" == parseargs.name
-        assert False is parseargs.report
-
-    @mock.patch("cloudinit.cmd.main.main_features")
-    def test_features_hook_subcommand(self, m_features):
-        """The subcommand 'features' calls main_features with args."""
-        self._call_main(["cloud-init", "features"])
-        (name, parseargs) = m_features.call_args_list[0][0]
-        assert "features" == name
-        assert "features" == parseargs.subcommand
-        assert "features" == parseargs.action[0]
-        assert False is parseargs.debug
-        assert False is parseargs.force